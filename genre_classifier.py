@@ -1,66 +1,498 @@
 """Simple module for fiction/non-fiction classification using HuggingFace."""
 
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
 import torch
-from transformers import pipeline, AutoModelForSequenceClassification, AutoTokenizer
-from transformers.pipelines import Pipeline
-from typing import Tuple, Optional
+from transformers import pipeline, AutoModelForSequenceClassification, AutoTokenizer, BitsAndBytesConfig
+from transformers.pipelines import Pipeline, ZeroShotClassificationPipeline
+from typing import Callable, Dict, List, Tuple, Optional, Union
+from diskcache import Cache
+from genre_classifier_mini import MiniGenreClassifier, load_mini_classifier
 
-def initialize_classifier() -> Optional[Pipeline]:
-    """Initialize the zero-shot classification pipeline."""
+MODEL_NAME = "valhalla/distilbart-mnli-12-3"
+EXPORTED_FILE_NAME = "model.onnx"
+QUANTIZED_FILE_NAME = "model_quantized.onnx"
+# (title, label) pairs per forward pass, i.e. 16 titles with two labels
+BATCH_SIZE = 32
+# Accepted values for the CLASSIFIER_DTYPE override
+DTYPES = {
+    'float32': torch.float32,
+    'bfloat16': torch.bfloat16,
+    'float16': torch.float16
+}
+# Titles the mini classifier is less sure about go to the zero-shot model
+MINI_CONFIDENCE_THRESHOLD = 0.9
+
+# Define more specific labels
+CANDIDATE_LABELS = [
+    "a fictional story or novel",
+    "a non-fiction book or educational material"
+]
+HYPOTHESIS_TEMPLATE = "This text is about {}"
+# Create a more descriptive input text
+INPUT_TEMPLATE = "Book title: {}"
+# Changes whenever the prompt does, so stale cached results are not reused
+PROMPT_VERSION = hashlib.sha1(
+    repr((INPUT_TEMPLATE, CANDIDATE_LABELS, HYPOTHESIS_TEMPLATE)).encode()
+).hexdigest()[:12]
+
+_classifier: Optional[Pipeline] = None
+_cache: Optional[Cache] = None
+_mini_classifier: Optional[MiniGenreClassifier] = None
+_mini_dir: Optional[str] = None
+
+class CachedHypothesisPipeline(ZeroShotClassificationPipeline):
+    """Zero-shot pipeline that tokenizes each hypothesis only once.
+
+    The candidate labels and hypothesis template never change, so their
+    token ids are cached in self._label_encodings; only the premise (the
+    title) is tokenized per call, and only once across its labels.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._label_encodings: Dict[str, List[int]] = {}
+        self._last_premise: Tuple[str, List[int]] = ("", [])
+
+    def _parse_and_tokenize(self, sequence_pairs, *args, **kwargs):
+        if len(sequence_pairs) != 1 or self.framework != "pt":
+            return super()._parse_and_tokenize(sequence_pairs, *args, **kwargs)
+
+        premise, hypothesis = sequence_pairs[0]
+        if (hypothesis_ids := self._label_encodings.get(hypothesis)) is None:
+            hypothesis_ids = self.tokenizer(hypothesis, add_special_tokens=False)['input_ids']
+            self._label_encodings[hypothesis] = hypothesis_ids
+
+        # Labels for the same title arrive back to back
+        if self._last_premise[0] != premise:
+            self._last_premise = (premise, self.tokenizer(premise, add_special_tokens=False)['input_ids'])
+        premise_ids = self._last_premise[1]
+
+        # Truncate the premise only, matching the pipeline's ONLY_FIRST strategy;
+        # the tokenizer adds whichever extra inputs (e.g. token_type_ids) the model needs
+        return self.tokenizer.prepare_for_model(
+            premise_ids,
+            hypothesis_ids,
+            truncation="only_first",
+            return_tensors="pt",
+            prepend_batch_axis=True
+        )
+
+    def _forward(self, inputs):
+        model_outputs = super()._forward(inputs)
+        # Older transformers releases call .numpy() on the logits in
+        # postprocess, which fails for bfloat16 tensors
+        model_outputs["logits"] = model_outputs["logits"].float()
+        return model_outputs
+
+def _model_cache_dir(env_var: str, default: str) -> Path:
+    """Return the cache directory for MODEL_NAME under the configured root.
+
+    Each model gets its own subdirectory, so changing MODEL_NAME triggers a
+    fresh save instead of silently reusing the old weights.
+    """
+    return Path(os.getenv(env_var, default)) / MODEL_NAME.replace('/', '--')
+
+def _save_atomically(save_dir: Path, save: Callable[[Path], None]) -> None:
+    """Run save into a temporary sibling directory, then move it into place.
+
+    save_dir only ever appears complete, so an interrupted save leaves
+    nothing behind that a later run would mistake for a finished cache.
+    """
+    save_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f".{save_dir.name}-", dir=save_dir.parent))
     try:
-        model_name = "facebook/bart-large-mnli"
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModelForSequenceClassification.from_pretrained(
-            model_name,
-            torch_dtype=torch.float32,
-            device_map="auto"
+        save(tmp_dir)
+        if save_dir.exists():
+            # Another run finished the same save first
+            shutil.rmtree(tmp_dir)
+        else:
+            os.replace(tmp_dir, save_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+def _onnx_uses_cuda() -> bool:
+    """Return True if the installed ONNX Runtime has the CUDA provider."""
+    import onnxruntime
+    return "CUDAExecutionProvider" in onnxruntime.get_available_providers()
+
+def _load_onnx_classifier(tokenizer) -> Pipeline:
+    """Build a pipeline around an ONNX export of the model.
+
+    The export and quantization run once into a per-model directory under
+    ONNX_MODEL_DIR; later runs load straight from it. By default the INT8
+    dynamically quantized model runs on CPU. When the installed ONNX
+    Runtime has the CUDA provider (the onnxruntime-gpu build), the
+    unquantized export runs on it with IO binding, so inputs and outputs
+    are bound on the device rather than copied through host memory on
+    every call.
+    """
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from optimum.pipelines import pipeline as ort_pipeline
+
+    def export(export_dir: Path) -> None:
+        ort_model = ORTModelForSequenceClassification.from_pretrained(MODEL_NAME, export=True)
+        ort_model.save_pretrained(export_dir)
+        quantizer = ORTQuantizer.from_pretrained(ort_model)
+        quantizer.quantize(
+            save_dir=export_dir,
+            quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
         )
-        model.eval()
-        
-        classifier = pipeline(
-            "zero-shot-classification",
-            model=model,
-            tokenizer=tokenizer,
-            device_map="auto"
+
+    save_dir = _model_cache_dir('ONNX_MODEL_DIR', 'onnx_model')
+    if not save_dir.exists():
+        _save_atomically(save_dir, export)
+
+    if _onnx_uses_cuda():
+        model = ORTModelForSequenceClassification.from_pretrained(
+            save_dir,
+            file_name=EXPORTED_FILE_NAME,
+            provider="CUDAExecutionProvider",
+            use_io_binding=True
         )
-        return classifier
-        
+    else:
+        model = ORTModelForSequenceClassification.from_pretrained(save_dir, file_name=QUANTIZED_FILE_NAME)
+    return ort_pipeline(
+        "zero-shot-classification",
+        model=model,
+        tokenizer=tokenizer,
+        accelerator="ort",
+        pipeline_class=CachedHypothesisPipeline
+    )
+
+def _select_dtype() -> torch.dtype:
+    """Pick the fastest safe dtype for the available hardware.
+
+    FP16 on GPU, BF16 on CPUs with native AVX-512 BF16 support, FP32
+    otherwise. CLASSIFIER_DTYPE (float32/bfloat16/float16) overrides the
+    choice, e.g. for older CPUs where emulated BF16 is slower than FP32.
+    """
+    if override := os.getenv('CLASSIFIER_DTYPE'):
+        if (dtype := DTYPES.get(override.lower())) is None:
+            raise ValueError(
+                f"Invalid CLASSIFIER_DTYPE '{override}', expected one of: {', '.join(DTYPES)}"
+            )
+        return dtype
+    if torch.cuda.is_available():
+        return torch.float16
+    bf16_check = getattr(torch.cpu, '_is_avx512_bf16_supported', None)
+    if bf16_check is not None and bf16_check():
+        return torch.bfloat16
+    return torch.float32
+
+def _env_flag(name: str) -> bool:
+    """Return True if the environment variable is set to a truthy value."""
+    return os.getenv(name, '').lower() in ('1', 'true', 'yes')
+
+def _cache_torch_model() -> Path:
+    """Return a local safetensors copy of the model, saving it on first use.
+
+    safetensors files are memory-mapped on load instead of unpickled and
+    copied, which cuts start-up time and peak RAM on later runs. The copy
+    lives in a per-model directory under TORCH_MODEL_DIR.
+    """
+    def save(model_dir: Path) -> None:
+        model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
+        model.save_pretrained(model_dir, safe_serialization=True)
+
+    save_dir = _model_cache_dir('TORCH_MODEL_DIR', 'torch_model')
+    if not save_dir.exists():
+        _save_atomically(save_dir, save)
+    return save_dir
+
+def _load_torch_classifier(tokenizer) -> Pipeline:
+    """Build a pipeline around the eager PyTorch model.
+
+    On GPU, CLASSIFIER_LOAD_IN_8BIT=1 loads INT8 weights with bitsandbytes
+    to halve model memory; benchmark it against FP16 before enabling, as its
+    kernels are tuned for large batches rather than small inference calls.
+    """
+    dtype = _select_dtype()
+    model_dir = _cache_torch_model()
+    # Pin the whole model to one device; device_map="auto" would install
+    # accelerate dispatch hooks that run on every forward pass
+    device = 0 if torch.cuda.is_available() else -1
+    load_in_8bit = device >= 0 and _env_flag('CLASSIFIER_LOAD_IN_8BIT')
+    if load_in_8bit:
+        # bitsandbytes places the weights itself and the model cannot be moved afterwards
+        model = AutoModelForSequenceClassification.from_pretrained(
+            model_dir,
+            torch_dtype=dtype,
+            quantization_config=BitsAndBytesConfig(load_in_8bit=True),
+            device_map={"": device}
+        )
+    else:
+        model = AutoModelForSequenceClassification.from_pretrained(
+            model_dir,
+            torch_dtype=dtype,
+            low_cpu_mem_usage=True
+        ).to(device if device >= 0 else "cpu")
+    model.eval()
+    for param in model.parameters():
+        param.requires_grad_(False)
+
+    if device < 0:
+        try:
+            import intel_extension_for_pytorch as ipex
+            model = ipex.optimize(model, dtype=dtype)
+        except ImportError:
+            pass
+
+    # bitsandbytes 8-bit layers do not compile, so leave them eager
+    compile_model = not _env_flag('DISABLE_TORCH_COMPILE') and not load_in_8bit
+    if compile_model and hasattr(torch, "compile"):
+        model = torch.compile(model, mode="reduce-overhead", fullgraph=False)
+
+    classifier = pipeline(
+        "zero-shot-classification",
+        model=model,
+        tokenizer=tokenizer,
+        pipeline_class=CachedHypothesisPipeline,
+        device=None if load_in_8bit else device
+    )
+
+    if compile_model:
+        # Pay the one-off graph compilation cost here rather than on the first title
+        with torch.inference_mode():
+            classifier(
+                "warmup",
+                candidate_labels=CANDIDATE_LABELS,
+                hypothesis_template=HYPOTHESIS_TEMPLATE
+            )
+    return classifier
+
+def initialize_classifier() -> Optional[Pipeline]:
+    """Initialize the zero-shot classification pipeline.
+
+    Uses the ONNX Runtime backend by default; set CLASSIFIER_BACKEND=torch
+    to run the model through PyTorch instead.
+    """
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+        if os.getenv('CLASSIFIER_BACKEND', 'onnx').lower() == 'torch':
+            return _load_torch_classifier(tokenizer)
+        return _load_onnx_classifier(tokenizer)
+
     except Exception as e:
         print(f"Failed to initialize classifier: {str(e)}")
         return None
 
-def classify_genre(classifier: Pipeline, title: str) -> Tuple[str, float]:
+def get_classifier() -> Optional[Pipeline]:
+    """Return the shared classifier, initializing it on first use."""
+    global _classifier
+    _classifier = _classifier or initialize_classifier()
+    return _classifier
+
+def _to_genre(result: Dict) -> Tuple[str, float]:
+    """Map a pipeline result to our (genre, confidence) output format."""
+    genre = "Fiction" if "fictional" in result['labels'][0] else "Non-Fiction"
+    return (genre, result['scores'][0])
+
+def _get_cache() -> Cache:
+    """Return the on-disk classification cache, opening it on first use."""
+    global _cache
+    if _cache is None:
+        _cache = Cache(os.getenv('GENRE_CACHE_DIR', '.genre_cache'))
+    return _cache
+
+def _run_classifier(
+    classifier: Pipeline,
+    titles: List[str],
+    batch_size: int
+) -> List[Tuple[str, float]]:
+    """Run the pipeline over titles in batches, returning results in input order."""
+    try:
+        inputs = [INPUT_TEMPLATE.format(title) for title in titles]
+        
+        # Sort by token length so each batch only pads to its own longest title
+        lengths = [len(ids) for ids in classifier.tokenizer(inputs, add_special_tokens=False)['input_ids']]
+        order = sorted(range(len(inputs)), key=lengths.__getitem__)
+        
+        with torch.inference_mode():
+            results = classifier(
+                [inputs[i] for i in order],
+                candidate_labels=CANDIDATE_LABELS,
+                hypothesis_template=HYPOTHESIS_TEMPLATE,
+                batch_size=batch_size
+            )
+        if isinstance(results, dict):
+            results = [results]
+        
+        # Scatter results back to the caller's order
+        genres: List[Tuple[str, float]] = [("error", 0.0)] * len(titles)
+        for i, result in zip(order, results):
+            genres[i] = _to_genre(result)
+        return genres
+        
+    except Exception as e:
+        print(f"Error classifying batch of {len(titles)} titles: {str(e)}")
+        return [("error", 0.0)] * len(titles)
+
+def _get_mini_classifier() -> Optional[MiniGenreClassifier]:
+    """Return the mini classifier trained in MINI_MODEL_DIR, or None if none has been trained."""
+    global _mini_classifier, _mini_dir
+    mini_dir = os.getenv('MINI_MODEL_DIR', 'mini_model')
+    if mini_dir != _mini_dir:
+        _mini_classifier = load_mini_classifier(mini_dir)
+        _mini_dir = mini_dir
+    return _mini_classifier
+
+def _zero_shot_id() -> str:
+    """Identify the zero-shot backend and precision that produce cached results."""
+    if os.getenv('CLASSIFIER_BACKEND', 'onnx').lower() != 'torch':
+        return "onnx-cuda" if _onnx_uses_cuda() else "onnx-int8"
+    int8 = "-int8" if torch.cuda.is_available() and _env_flag('CLASSIFIER_LOAD_IN_8BIT') else ""
+    return f"torch-{str(_select_dtype()).replace('torch.', '')}{int8}"
+
+def _run_zero_shot(
+    load_classifier: Callable[[], Optional[Pipeline]],
+    titles: List[str],
+    batch_size: int
+) -> List[Tuple[str, float]]:
+    """Load the zero-shot pipeline if needed and run it over titles."""
+    if (classifier := load_classifier()) is None:
+        print("Failed to initialize genre classifier")
+        return [("error", 0.0)] * len(titles)
+    return _run_classifier(classifier, titles, batch_size)
+
+def _classify_uncached(
+    load_classifier: Callable[[], Optional[Pipeline]],
+    titles: List[str],
+    batch_size: int,
+    use_mini: bool
+) -> Tuple[List[Tuple[str, float]], List[int]]:
+    """Classify titles with the mini classifier, falling back to zero-shot when unsure.
+    
+    The zero-shot pipeline is only loaded if some title needs it. Returns
+    the results along with the indices the zero-shot model answered.
+    """
+    everything = list(range(len(titles)))
+    if not use_mini or (mini := _get_mini_classifier()) is None:
+        return _run_zero_shot(load_classifier, titles, batch_size), everything
+    
+    try:
+        results = mini.predict(titles)
+    except Exception as e:
+        print(f"Error running mini classifier: {str(e)}")
+        return _run_zero_shot(load_classifier, titles, batch_size), everything
+    
+    unsure = [i for i, (_, confidence) in enumerate(results) if confidence < MINI_CONFIDENCE_THRESHOLD]
+    if unsure:
+        fallback = _run_zero_shot(load_classifier, [titles[i] for i in unsure], batch_size)
+        for i, result in zip(unsure, fallback):
+            results[i] = result
+    return results, unsure
+
+def _classify_cached(
+    classifier: Union[Pipeline, Callable[[], Optional[Pipeline]], None],
+    titles: List[str],
+    batch_size: int,
+    cache: Optional[Cache],
+    use_mini: bool
+) -> List[Tuple[str, float]]:
+    """Answer titles from the cache, classify the rest and cache zero-shot results."""
+    if not titles:
+        return []
+    
+    if cache is None:
+        cache = _get_cache()
+    key_prefix = (MODEL_NAME, _zero_shot_id(), PROMPT_VERSION)
+    keys = [key_prefix + (title.lower().strip(),) for title in titles]
+    known: Dict[Tuple[str, ...], Tuple[str, float]] = {}
+    pending: Dict[Tuple[str, ...], str] = {}
+    
+    for key, title in zip(keys, titles):
+        if key in known or key in pending:
+            continue
+        if (cached := cache.get(key)) is not None:
+            known[key] = cached
+        else:
+            pending[key] = title
+    
+    if pending:
+        pending_keys = list(pending)
+        # Pipelines are callable too, so anything else must be the factory
+        is_factory = classifier is not None and not isinstance(classifier, Pipeline)
+        load_classifier = classifier if is_factory else (lambda: classifier)
+        results, zero_shot = _classify_uncached(load_classifier, list(pending.values()), batch_size, use_mini)
+        known.update(zip(pending_keys, results))
+        for i in zero_shot:
+            if results[i][0] != "error":
+                cache[pending_keys[i]] = results[i]
+    
+    return [known[key] for key in keys]
+
+def classify_genres(
+    classifier: Union[Pipeline, Callable[[], Optional[Pipeline]], None],
+    titles: List[str],
+    batch_size: int = BATCH_SIZE,
+    cache: Optional[Cache] = None
+) -> List[Tuple[str, float]]:
+    """Classify several book titles in batched pipeline calls.
+    
+    Zero-shot results are cached on disk by normalized title, keyed on the
+    model, backend and prompt, so repeated or duplicate titles only go
+    through the model once. If a mini classifier has been trained (see
+    genre_classifier_mini), it handles uncached titles first and only
+    low-confidence ones reach the zero-shot model; its own answers are
+    cheap to recompute and are not cached.
+    
+    Args:
+        classifier: HuggingFace pipeline object, or a factory returning one
+            that is only called if some title needs the zero-shot model;
+            None means it failed to load, so such titles come back as errors
+        titles: Book titles to classify
+        batch_size: Number of (title, label) pairs per forward pass; with two
+            candidate labels, 32 means 16 titles
+        cache: Classification cache to use instead of the one in GENRE_CACHE_DIR
+        
+    Returns:
+        List of (genre, confidence_score) tuples, in the same order as titles
+    """
+    return _classify_cached(classifier, titles, batch_size, cache, use_mini=True)
+
+def classify_genres_zero_shot(
+    classifier: Union[Pipeline, Callable[[], Optional[Pipeline]], None],
+    titles: List[str],
+    batch_size: int = BATCH_SIZE,
+    cache: Optional[Cache] = None
+) -> List[Tuple[str, float]]:
+    """Classify several book titles with the zero-shot model only.
+    
+    Like classify_genres, but never consults the mini classifier. Results
+    share its cache, so titles labeled here (e.g. to train the mini
+    classifier) are answered from the cache on the next run.
+    
+    Args:
+        classifier: As for classify_genres
+        titles: Book titles to classify
+        batch_size: Number of (title, label) pairs per forward pass; with two
+            candidate labels, 32 means 16 titles
+        cache: Classification cache to use instead of the one in GENRE_CACHE_DIR
+        
+    Returns:
+        List of (genre, confidence_score) tuples, in the same order as titles
+    """
+    return _classify_cached(classifier, titles, batch_size, cache, use_mini=False)
+
+def classify_genre(
+    classifier: Optional[Pipeline],
+    title: str,
+    cache: Optional[Cache] = None
+) -> Tuple[str, float]:
     """Classify a book title as fiction or non-fiction.
     
     Args:
-        classifier: HuggingFace pipeline object
+        classifier: HuggingFace pipeline object, or None if it failed to load
         title: Book title to classify
+        cache: Classification cache to use instead of the one in GENRE_CACHE_DIR
         
     Returns:
         Tuple of (genre, confidence_score)
     """
-    try:
-        # Create a more descriptive input text
-        input_text = f"Book title: {title}"
-        
-        # Define more specific labels
-        candidate_labels = [
-            "a fictional story or novel",
-            "a non-fiction book or educational material"
-        ]
-        
-        result = classifier(
-            input_text,
-            candidate_labels=candidate_labels,
-            hypothesis_template="This text is about {}"
-        )
-        
-        # Map the result to our desired output format
-        genre = "Fiction" if "fictional" in result['labels'][0] else "Non-Fiction"
-        confidence = result['scores'][0]
-        
-        return (genre, confidence)
-        
-    except Exception as e:
-        print(f"Error classifying title '{title}': {str(e)}")
-        return ("error", 0.0)
\ No newline at end of file
+    return classify_genres(classifier, [title], cache=cache)[0]
\ No newline at end of file
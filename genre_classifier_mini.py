@@ -0,0 +1,182 @@
+"""Small fine-tuned fiction/non-fiction classifier distilled from the zero-shot model.
+
+A MiniLM sentence encoder with a linear head gives a label in a single
+forward pass per title, instead of one NLI pass per candidate label. It is
+trained on titles labeled by the zero-shot model itself; run this module
+to train it from the configured sheet.
+"""
+
+import os
+import random
+from pathlib import Path
+import torch
+from torch import nn
+from transformers import AutoModel, AutoTokenizer
+from typing import List, Tuple, Optional
+
+ENCODER_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+LABELS = ["Fiction", "Non-Fiction"]
+WEIGHTS_FILE_NAME = "mini_classifier.pt"
+
+class MiniGenreClassifier(nn.Module):
+    """MiniLM encoder with a mean-pooled linear fiction/non-fiction head."""
+
+    def __init__(self, encoder_name: str = ENCODER_NAME):
+        super().__init__()
+        self.tokenizer = AutoTokenizer.from_pretrained(encoder_name)
+        self.encoder = AutoModel.from_pretrained(encoder_name)
+        self.head = nn.Linear(self.encoder.config.hidden_size, len(LABELS))
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        hidden = self.encoder(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+        mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        return self.head(pooled)
+
+    def _encode(self, titles: List[str]) -> dict:
+        device = next(self.parameters()).device
+        encoded = self.tokenizer(titles, padding=True, truncation=True, return_tensors="pt")
+        return {name: tensor.to(device) for name, tensor in encoded.items() if name != "token_type_ids"}
+
+    def predict(self, titles: List[str], batch_size: int = 64) -> List[Tuple[str, float]]:
+        """Classify titles, returning (genre, confidence) tuples in input order."""
+        self.eval()
+        results: List[Tuple[str, float]] = []
+        with torch.inference_mode():
+            for start in range(0, len(titles), batch_size):
+                probs = self(**self._encode(titles[start:start + batch_size])).softmax(dim=-1)
+                scores, indices = probs.max(dim=-1)
+                results.extend(
+                    (LABELS[index], score)
+                    for index, score in zip(indices.tolist(), scores.tolist())
+                )
+        return results
+
+def bootstrap_labels(
+    classifier,
+    titles: List[str],
+    min_confidence: float = 0.8
+) -> Tuple[List[str], List[int]]:
+    """
+    Label titles with the zero-shot classifier, keeping only confident ones.
+
+    Labels come from the zero-shot pipeline, never from an existing mini
+    classifier, so retraining does not fit the student to its own
+    predictions. They also go into the classification cache, so the next
+    run reuses the teacher's answers for these titles.
+
+    Args:
+        classifier: Zero-shot HuggingFace pipeline used as the teacher
+        titles: Unlabeled book titles
+        min_confidence: Minimum teacher confidence for a title to be kept
+
+    Returns:
+        Tuple of (titles, label_indices) usable as training data
+    """
+    from genre_classifier import classify_genres_zero_shot
+
+    kept_titles: List[str] = []
+    labels: List[int] = []
+    for title, (genre, confidence) in zip(titles, classify_genres_zero_shot(classifier, titles)):
+        if genre in LABELS and confidence >= min_confidence:
+            kept_titles.append(title)
+            labels.append(LABELS.index(genre))
+    return kept_titles, labels
+
+def train_mini_classifier(
+    titles: List[str],
+    labels: List[int],
+    epochs: int = 3,
+    batch_size: int = 32,
+    learning_rate: float = 2e-5
+) -> MiniGenreClassifier:
+    """
+    Fine-tune a MiniGenreClassifier on labeled titles.
+
+    Args:
+        titles: Book titles
+        labels: Index into LABELS for each title
+        epochs: Number of passes over the data
+        batch_size: Titles per optimizer step
+        learning_rate: AdamW learning rate
+
+    Returns:
+        The trained model, in eval mode
+    """
+    model = MiniGenreClassifier()
+    if torch.cuda.is_available():
+        model = model.cuda()
+    optimizer = torch.optim.AdamW(model.parameters(), lr=learning_rate)
+    loss_fn = nn.CrossEntropyLoss()
+    examples = list(zip(titles, labels))
+
+    model.train()
+    for epoch in range(epochs):
+        random.shuffle(examples)
+        total_loss = 0.0
+        for start in range(0, len(examples), batch_size):
+            batch_titles, batch_labels = zip(*examples[start:start + batch_size])
+            logits = model(**model._encode(list(batch_titles)))
+            target = torch.tensor(batch_labels, device=logits.device)
+            loss = loss_fn(logits, target)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(batch_titles)
+        print(f"Epoch {epoch + 1}/{epochs}: loss {total_loss / max(len(examples), 1):.4f}")
+
+    model.eval()
+    return model
+
+def save_mini_classifier(model: MiniGenreClassifier, save_dir: str) -> None:
+    """Save the trained weights to save_dir."""
+    Path(save_dir).mkdir(parents=True, exist_ok=True)
+    torch.save(model.state_dict(), Path(save_dir) / WEIGHTS_FILE_NAME)
+
+def load_mini_classifier(save_dir: str) -> Optional[MiniGenreClassifier]:
+    """Load trained weights from save_dir, or return None if none are saved."""
+    weights_path = Path(save_dir) / WEIGHTS_FILE_NAME
+    if not weights_path.exists():
+        return None
+    try:
+        model = MiniGenreClassifier()
+        model.load_state_dict(torch.load(weights_path, map_location="cpu"))
+        if torch.cuda.is_available():
+            model = model.cuda()
+        model.eval()
+        return model
+    except Exception as e:
+        print(f"Failed to load mini classifier: {str(e)}")
+        return None
+
+def main() -> None:
+    """Train the mini classifier on titles read from the configured sheet."""
+    from dotenv import load_dotenv
+    from main import validate_env
+    from sheets_operations import get_service, read_book_titles
+    from genre_classifier import get_classifier
+
+    load_dotenv()
+    config = validate_env()
+    if not (service := get_service(config['GOOGLE_CREDENTIALS_PATH'])):
+        print("Failed to initialize Google Sheets service")
+        return
+    if not (classifier := get_classifier()):
+        print("Failed to initialize genre classifier")
+        return
+
+    titles = [title for title, _, _ in read_book_titles(service, config['SPREADSHEET_ID'], config['SHEET_RANGE'])]
+    print(f"Labeling {len(titles)} titles with the zero-shot classifier...")
+    train_titles, labels = bootstrap_labels(classifier, titles)
+    if not train_titles:
+        print("No confidently labeled titles to train on")
+        return
+
+    print(f"Training on {len(train_titles)} titles...")
+    model = train_mini_classifier(train_titles, labels)
+    save_dir = os.getenv('MINI_MODEL_DIR', 'mini_model')
+    save_mini_classifier(model, save_dir)
+    print(f"Saved mini classifier to {save_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,19 @@
 """Main script for classifying book genres and updating Google Sheets."""
 
 import os
-from typing import List, Tuple, Dict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Tuple, Dict, Optional, TypeVar
 from dotenv import load_dotenv
-from sheets_operations import get_service, read_book_titles, write_genres
-from genre_classifier import initialize_classifier, classify_genre
+from googleapiclient.errors import HttpError
+from sheets_operations import get_service, read_book_titles, read_existing_genres, write_genres
+from genre_classifier import get_classifier, classify_genres
+from transformers.pipelines import Pipeline
+
+T = TypeVar('T')
+CHUNK_SIZE = 100
+# Kept small so concurrent writes stay within the Sheets per-minute quota
+WRITE_WORKERS = 2
 
 def validate_env() -> Dict[str, str]:
     """Validate and return environment variables."""
@@ -22,63 +31,115 @@ def validate_env() -> Dict[str, str]:
     
     return config
 
-def process_books(service, classifier, spreadsheet_id: str, sheet_range: str) -> None:
-    """Process books and update their genres."""
-    if not (books := read_book_titles(service, spreadsheet_id, sheet_range)):
-        print("No books found to process")
-        return
+def chunked(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Yield successive lists of up to size items from an iterable."""
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+def process_books(
+    service,
+    spreadsheet_id: str,
+    sheet_range: str,
+    classifier_factory: Callable[[], Optional[Pipeline]] = get_classifier
+) -> None:
+    """Process books and update their genres.
     
-    print(f"\nProcessing {len(books)} books...")
-    current_batch: List[Tuple[str, str]] = []
-    processed = updated = 0
+    Titles are streamed from the sheet in chunks, so the next page is
+    downloaded while the current chunk is classified, and genre writes run
+    on a thread pool while the model moves on to the next chunk. The
+    zero-shot classifier is only loaded once a title actually needs it,
+    i.e. it is not cached and the mini classifier (if any) is unsure.
+    """
+    sheet_name = sheet_range.split('!')[0]
+    # Holds the single load attempt, so a failed load is not retried per chunk
+    loaded: List[Optional[Pipeline]] = []
     
-    for title, row, column in books:
-        sheet_name = sheet_range.split('!')[0]
-        genre_range = f"{sheet_name}!F{row}"
-        
-        print(f"\nProcessing: '{title}'")
-        
-        # Check existing genre
+    def load_classifier() -> Optional[Pipeline]:
+        if not loaded:
+            loaded.append(classifier_factory())
+        return loaded[0]
+    
+    seen = processed = updated = 0
+    # Cleared when the run stops early, so a partial run is reported as such
+    complete = True
+    pending_writes: Dict[Future, int] = {}
+    
+    with ThreadPoolExecutor(max_workers=WRITE_WORKERS) as write_pool:
         try:
-            existing = service.spreadsheets().values().get(
-                spreadsheetId=spreadsheet_id,
-                range=genre_range
-            ).execute()
+            for books in chunked(read_book_titles(service, spreadsheet_id, sheet_range), CHUNK_SIZE):
+                seen += len(books)
+                titles_to_classify: List[str] = []
+                genre_ranges: List[str] = []
+                
+                # Check existing genres for every row in the chunk in a single request
+                rows = [row for _, row, _ in books]
+                try:
+                    existing_genres = read_existing_genres(
+                        service, spreadsheet_id, sheet_name, min(rows), max(rows)
+                    )
+                except Exception as e:
+                    print(f"Error checking existing genres: {e}")
+                    complete = False
+                    break
+                
+                for title, row, column in books:
+                    genre_range = f"{sheet_name}!F{row}"
+                    
+                    if (existing := existing_genres.get(row)) and existing.lower() != 'unknown':
+                        print(f"Skipping '{title}' - genre exists: '{existing}'")
+                        continue
+                    
+                    titles_to_classify.append(title)
+                    genre_ranges.append(genre_range)
+                
+                if not titles_to_classify:
+                    continue
+                
+                # Classify the chunk's remaining titles in batched forward passes
+                print(f"\nClassifying {len(titles_to_classify)} books...")
+                results = classify_genres(load_classifier, titles_to_classify)
+                if loaded and loaded[0] is None:
+                    complete = False
+                    break
+                
+                current_batch: List[Tuple[str, str]] = []
+                
+                for title, genre_range, (genre, confidence) in zip(titles_to_classify, genre_ranges, results):
+                    if genre != "error":
+                        current_batch.append((genre_range, genre))
+                        print(f"'{title}' classified as: {genre} (confidence: {confidence:.2f})")
+                    
+                    # Write batch in the background if size limit reached
+                    if len(current_batch) >= 10:
+                        pending_writes[write_pool.submit(write_genres, service, spreadsheet_id, current_batch)] = len(current_batch)
+                        current_batch = []
+                    
+                    processed += 1
+                    if processed % 10 == 0:
+                        print(f"\nProgress: {processed} books classified")
+                
+                # Write remaining updates
+                if current_batch:
+                    pending_writes[write_pool.submit(write_genres, service, spreadsheet_id, current_batch)] = len(current_batch)
             
-            if (existing.get('values', [['']])[0][0].strip() and 
-                existing['values'][0][0].lower() != 'unknown'):
-                print(f"Skipping - genre exists: '{existing['values'][0][0]}'")
-                continue
-        except Exception as e:
-            print(f"Error checking genre: {e}")
-            continue
+        except HttpError as e:
+            print(f"Error reading from Google Sheets: {str(e)}")
+            complete = False
         
-        # Classify genre
-        try:
-            genre, confidence = classify_genre(classifier, title)
-            if genre != "error":
-                current_batch.append((genre_range, genre))
-                print(f"Classified as: {genre} (confidence: {confidence:.2f})")
-            
-            # Write batch if size limit reached
-            if len(current_batch) >= 10:
-                if write_genres(service, spreadsheet_id, current_batch):
-                    updated += len(current_batch)
-                current_batch = []
-            
-            processed += 1
-            if processed % 10 == 0:
-                print(f"\nProgress: {processed}/{len(books)} books")
-                
-        except Exception as e:
-            print(f"Error processing '{title}': {e}")
-            continue
+        for future in as_completed(pending_writes):
+            try:
+                if future.result():
+                    updated += pending_writes[future]
+            except Exception as e:
+                print(f"Error writing genres: {e}")
     
-    # Write remaining updates
-    if current_batch and write_genres(service, spreadsheet_id, current_batch):
-        updated += len(current_batch)
+    if not seen and complete:
+        print("No books found to process")
+        return
     
-    print(f"\nComplete: {processed} processed, {updated} updated")
+    status = "Complete" if complete else "Incomplete"
+    print(f"\n{status}: {seen} read, {processed} processed, {updated} updated")
 
 def main() -> None:
     """Entry point of the script."""
@@ -89,12 +150,8 @@ def main() -> None:
         if not (service := get_service(config['GOOGLE_CREDENTIALS_PATH'])):
             print("Failed to initialize Google Sheets service")
             return
-            
-        if not (classifier := initialize_classifier()):
-            print("Failed to initialize genre classifier")
-            return
         
-        process_books(service, classifier, config['SPREADSHEET_ID'], config['SHEET_RANGE'])
+        process_books(service, config['SPREADSHEET_ID'], config['SHEET_RANGE'])
         
     except Exception as e:
         print(f"Error: {e}")
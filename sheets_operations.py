@@ -1,11 +1,19 @@
 """Module for handling Google Sheets operations."""
 
-from typing import List, Tuple, Optional
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Tuple, Optional
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
 from google.oauth2.service_account import Credentials as ServiceAccountCreds
 
+# Retries for rate-limited or failed requests; the client backs off exponentially
+API_RETRIES = 5
+
 def get_service(credentials_path: str) -> Optional[build]:
     """
     Create and return a Google Sheets service object.
@@ -21,53 +29,168 @@ def get_service(credentials_path: str) -> Optional[build]:
             credentials_path,
             scopes=['https://www.googleapis.com/auth/spreadsheets']
         )
-        return build('sheets', 'v4', credentials=credentials)
+        
+        # httplib2.Http is not thread-safe and pages are prefetched from a
+        # background thread, so keep one connection per thread
+        local = threading.local()
+        
+        def build_request(http, *args, **kwargs):
+            if not hasattr(local, 'http'):
+                local.http = AuthorizedHttp(credentials, http=httplib2.Http())
+            return HttpRequest(local.http, *args, **kwargs)
+        
+        return build('sheets', 'v4', credentials=credentials, requestBuilder=build_request)
     except Exception as e:
         print(f"Failed to create sheets service: {str(e)}")
         return None
 
+def _fetch_page(
+    service: build,
+    spreadsheet_id: str,
+    page_range: str
+) -> List[List[str]]:
+    """Fetch the raw values of a single page of the title column."""
+    result = service.spreadsheets().values().get(
+        spreadsheetId=spreadsheet_id,
+        range=page_range
+    ).execute(num_retries=API_RETRIES)
+    return result.get('values', [])
+
+def _sheet_row_count(
+    service: build,
+    spreadsheet_id: str,
+    sheet_name: str
+) -> int:
+    """Return the number of rows in the sheet's grid, from metadata only."""
+    result = service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id,
+        ranges=[sheet_name],
+        fields='sheets(properties(gridProperties(rowCount)))'
+    ).execute(num_retries=API_RETRIES)
+    return result['sheets'][0]['properties']['gridProperties']['rowCount']
+
 def read_book_titles(
     service: build,
     spreadsheet_id: str,
-    range_name: str
-) -> List[Tuple[str, int, str]]:
+    range_name: str,
+    page_size: int = 100
+) -> Iterator[Tuple[str, int, str]]:
     """
-    Read book titles from specified Google Sheet.
+    Stream book titles from specified Google Sheet, one page at a time.
+    
+    The next page is fetched in the background while the caller consumes
+    the current one. Every page up to the end of the range is read, so
+    blank gaps do not end the stream; an open-ended range like 'Sheet1!A2:A'
+    ends at the last row of the sheet's grid. A page that still fails
+    after retries raises HttpError, so a partial read is never mistaken
+    for the end of the sheet.
     
     Args:
         service: Google Sheets service object
         spreadsheet_id: ID of the target spreadsheet
         range_name: A1 notation of the range to read
+        page_size: Number of rows requested per page
         
-    Returns:
-        List of tuples containing (book_title, row_number, column_letter)
+    Yields:
+        Tuples containing (book_title, row_number, column_letter)
     """
-    try:
-        result = service.spreadsheets().values().get(
-            spreadsheetId=spreadsheet_id,
-            range=range_name
-        ).execute()
-        
-        values = result.get('values', [])
-        if not values:
-            return []
+    # Extract the column letter and row bounds from the range
+    # e.g., 'Sheet1!E2:E' -> column='E', start_row=2, end_row=None,
+    # while a single cell like 'Sheet1!E2' is just that row
+    sheet_name, cell_range = range_name.split('!')
+    first_cell, _, last_cell = cell_range.partition(':')
+    column = ''.join(c for c in first_cell if c.isalpha())
+    start_row = int(''.join(c for c in first_cell if c.isdigit()) or '1')
+    end_row: Optional[int] = start_row
+    if last_cell:
+        digits = ''.join(c for c in last_cell if c.isdigit())
+        end_row = int(digits) if digits else None
+    
+    def submit_page(executor: ThreadPoolExecutor, first_row: int) -> Optional[Future]:
+        if first_row > end_row:
+            return None
+        last_row = min(first_row + page_size - 1, end_row)
+        page_range = f"{sheet_name}!{column}{first_row}:{column}{last_row}"
+        return executor.submit(_fetch_page, service, spreadsheet_id, page_range)
+    
+    if end_row is None:
+        end_row = _sheet_row_count(service, spreadsheet_id, sheet_name)
+    
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        page_start = start_row
+        future = submit_page(executor, page_start)
+        while future is not None:
+            values = future.result()
             
-        # Extract the column letter and starting row from the range
-        # e.g., 'Sheet1!E2:E' -> column='E', start_row=2
-        range_parts = range_name.split('!')
-        cell_range = range_parts[1].split(':')[0]
-        column = ''.join(c for c in cell_range if c.isalpha())
-        start_row = int(''.join(c for c in cell_range if c.isdigit()) or '1')
+            # Prefetch the next page while this one is processed
+            future = submit_page(executor, page_start + page_size)
             
-        # Process data with correct row numbers
-        return [
-            (row[0], start_row + idx, column)  # Row number starts from the specified start row
-            for idx, row in enumerate(values)
-            if row  # Skip empty rows
-        ]
-    except HttpError as e:
-        print(f"Error reading from Google Sheets: {str(e)}")
-        return []
+            for idx, row in enumerate(values):
+                if row:  # Skip empty rows
+                    yield (row[0], page_start + idx, column)
+            page_start += page_size
+
+def read_existing_genres(
+    service: build,
+    spreadsheet_id: str,
+    sheet_name: str,
+    first_row: int,
+    last_row: int
+) -> Dict[int, str]:
+    """
+    Read the genre column (F) for a span of rows in a single request.
+    
+    Args:
+        service: Google Sheets service object
+        spreadsheet_id: ID of the target spreadsheet
+        sheet_name: Name of the sheet holding the genre column
+        first_row: First row number of the span
+        last_row: Last row number of the span
+        
+    Returns:
+        Dict mapping row number to its existing genre, for non-empty cells only
+    """
+    result = service.spreadsheets().values().get(
+        spreadsheetId=spreadsheet_id,
+        range=f"{sheet_name}!F{first_row}:F{last_row}"
+    ).execute(num_retries=API_RETRIES)
+    
+    return {
+        first_row + idx: row[0]
+        for idx, row in enumerate(result.get('values', []))
+        if row and row[0].strip()
+    }
+
+def _split_cell(cell_range: str) -> Tuple[str, str, int]:
+    """Split a single-cell A1 range like 'Sheet1!F12' into (sheet, column, row)."""
+    sheet_name, cell = cell_range.split('!')
+    column = ''.join(c for c in cell if c.isalpha())
+    row = int(''.join(c for c in cell if c.isdigit()))
+    return sheet_name, column, row
+
+def _contiguous_runs(updates: List[Tuple[str, str]]) -> List[Tuple[str, List[str]]]:
+    """
+    Merge single-cell updates into rectangular ranges of consecutive rows.
+    
+    Args:
+        updates: List of tuples containing cell ranges and corresponding genres
+        
+    Returns:
+        List of tuples containing a multi-row range and its genres, top to bottom
+    """
+    runs: List[Tuple[str, str, int, int, List[str]]] = []
+    for cell_range, genre in sorted(updates, key=lambda u: _split_cell(u[0])):
+        sheet_name, column, row = _split_cell(cell_range)
+        if runs and runs[-1][:2] == (sheet_name, column) and runs[-1][3] == row - 1:
+            last = runs[-1]
+            runs[-1] = (sheet_name, column, last[2], row, last[4] + [genre])
+        else:
+            runs.append((sheet_name, column, row, row, [genre]))
+    
+    return [
+        (f"{sheet_name}!{column}{first_row}:{column}{last_row}", genres)
+        for sheet_name, column, first_row, last_row, genres in runs
+    ]
 
 def write_genres(
     service: build,
@@ -77,6 +200,10 @@ def write_genres(
     """
     Write genre classifications back to the Google Sheet.
     
+    Consecutive rows are sent as one rectangular range. A single run is
+    written with values().update; fragmented runs fall back to batchUpdate.
+    Rate-limit (429) and server errors are retried with exponential backoff.
+    
     Args:
         service: Google Sheets service object
         spreadsheet_id: ID of the target spreadsheet
@@ -86,23 +213,34 @@ def write_genres(
         Boolean indicating success of the operation
     """
     try:
+        runs = _contiguous_runs(updates)
+        if len(runs) == 1:
+            run_range, genres = runs[0]
+            service.spreadsheets().values().update(
+                spreadsheetId=spreadsheet_id,
+                range=run_range,
+                valueInputOption='RAW',
+                body={'values': [[genre] for genre in genres]}
+            ).execute(num_retries=API_RETRIES)
+            return True
+        
         batch_data = {
             'valueInputOption': 'RAW',
             'data': [
                 {
-                    'range': cell_range,
-                    'values': [[genre]]
+                    'range': run_range,
+                    'values': [[genre] for genre in genres]
                 }
-                for cell_range, genre in updates
+                for run_range, genres in runs
             ]
         }
         
         service.spreadsheets().values().batchUpdate(
             spreadsheetId=spreadsheet_id,
             body=batch_data
-        ).execute()
+        ).execute(num_retries=API_RETRIES)
         return True
         
     except HttpError as e:
         print(f"Error writing to Google Sheets: {str(e)}")
-        return False 
\ No newline at end of file
+        return False
\ No newline at end of file
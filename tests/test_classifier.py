@@ -1,6 +1,25 @@
 """Test script for the genre classifier."""
 
-from genre_classifier import initialize_classifier, classify_genre
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+from unittest import mock
+from diskcache import Cache
+from transformers import AutoTokenizer
+from transformers.pipelines import ZeroShotClassificationPipeline
+import genre_classifier
+from genre_classifier import (
+    CANDIDATE_LABELS,
+    HYPOTHESIS_TEMPLATE,
+    INPUT_TEMPLATE,
+    MODEL_NAME,
+    CachedHypothesisPipeline,
+    initialize_classifier,
+    classify_genre,
+    classify_genres,
+    classify_genres_zero_shot
+)
 
 def test_classifier():
     print("Initializing classifier...")
@@ -13,12 +32,146 @@ def test_classifier():
         "A Brief History of Time" # Should be non-fiction
     ]
     
-    print("\nTesting classifier...")
-    for title in test_titles:
-        genre, confidence = classify_genre(classifier, title)
-        print(f"\nTitle: '{title}'")
-        print(f"Classification: {genre}")
-        print(f"Confidence: {confidence:.2f}")
+    # Use throwaway caches, so neither path is answered from the other's
+    # results or an earlier run, and an empty mini model directory, so
+    # every title goes through the zero-shot model
+    with tempfile.TemporaryDirectory() as cache_dir, tempfile.TemporaryDirectory() as mini_dir:
+        with mock.patch.dict(os.environ, {'MINI_MODEL_DIR': mini_dir}):
+            print("\nTesting classifier...")
+            single = []
+            with Cache(os.path.join(cache_dir, "single")) as cache:
+                for title in test_titles:
+                    genre, confidence = classify_genre(classifier, title, cache=cache)
+                    single.append((genre, confidence))
+                    print(f"\nTitle: '{title}'")
+                    print(f"Classification: {genre}")
+                    print(f"Confidence: {confidence:.2f}")
+            
+            print("\nTesting batched classifier...")
+            with Cache(os.path.join(cache_dir, "batched")) as cache:
+                batched = classify_genres(classifier, test_titles, batch_size=2, cache=cache)
+    
+    # Same labels in the same order as one-at-a-time classification
+    assert len(batched) == len(test_titles)
+    assert all(genre != "error" for genre, _ in batched)
+    assert [genre for genre, _ in batched] == [genre for genre, _ in single]
+
+class StubPipeline:
+    """Callable stand-in for the zero-shot pipeline that records its inputs.
+
+    Inputs mentioning a novel come back as fiction, everything else as
+    non-fiction; with fail=True every call raises instead.
+    """
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls: List[List[str]] = []
+        self.tokenizer = lambda inputs, **kwargs: {'input_ids': [text.split() for text in inputs]}
+
+    def __call__(self, inputs: List[str], **kwargs) -> List[Dict]:
+        self.calls.append(list(inputs))
+        if self.fail:
+            raise RuntimeError("stub failure")
+        return [
+            {
+                'labels': CANDIDATE_LABELS if "novel" in text.lower() else CANDIDATE_LABELS[::-1],
+                'scores': [0.9, 0.1]
+            }
+            for text in inputs
+        ]
+
+@contextmanager
+def stub_environment(**env: str) -> Iterator[Cache]:
+    """Yield a throwaway cache, with no mini classifier and a fixed torch backend."""
+    with tempfile.TemporaryDirectory() as cache_dir, tempfile.TemporaryDirectory() as mini_dir:
+        env = {'MINI_MODEL_DIR': mini_dir, 'CLASSIFIER_BACKEND': 'torch', 'CLASSIFIER_DTYPE': 'float32', **env}
+        with mock.patch.dict(os.environ, env), Cache(cache_dir) as cache:
+            yield cache
+
+def test_classify_genres_deduplicates_titles():
+    stub = StubPipeline()
+    with stub_environment() as cache:
+        results = classify_genres(lambda: stub, ["Novel A", " novel a", "Guide B", "Novel A"], cache=cache)
+    assert stub.calls == [[INPUT_TEMPLATE.format("Novel A"), INPUT_TEMPLATE.format("Guide B")]]
+    assert results == [("Fiction", 0.9), ("Fiction", 0.9), ("Non-Fiction", 0.9), ("Fiction", 0.9)]
+
+def test_classify_genres_keeps_input_order():
+    # Token lengths sort these differently from their input order
+    titles = ["A Long Novel About The Sea", "Guide", "Short Novel", "A Guide To Everything Else"]
+    stub = StubPipeline()
+    with stub_environment() as cache:
+        results = classify_genres(lambda: stub, titles, cache=cache)
+    assert [genre for genre, _ in results] == ["Fiction", "Non-Fiction", "Fiction", "Non-Fiction"]
+
+def test_classify_genres_does_not_cache_errors():
+    with stub_environment() as cache:
+        assert classify_genres(lambda: StubPipeline(fail=True), ["Novel A"], cache=cache) == [("error", 0.0)]
+        stub = StubPipeline()
+        assert classify_genres(lambda: stub, ["Novel A"], cache=cache) == [("Fiction", 0.9)]
+    assert len(stub.calls) == 1
+
+def test_classify_genres_separates_backends_and_prompts():
+    stub = StubPipeline()
+    with stub_environment() as cache:
+        classify_genres(lambda: stub, ["Novel A"], cache=cache)
+        classify_genres(lambda: stub, ["Novel A"], cache=cache)
+        assert len(stub.calls) == 1
+        
+        with mock.patch.dict(os.environ, {'CLASSIFIER_DTYPE': 'bfloat16'}):
+            classify_genres(lambda: stub, ["Novel A"], cache=cache)
+        assert len(stub.calls) == 2
+        
+        with mock.patch.object(genre_classifier, 'PROMPT_VERSION', 'changed'):
+            classify_genres(lambda: stub, ["Novel A"], cache=cache)
+        assert len(stub.calls) == 3
+
+def test_classify_genres_without_classifier():
+    with stub_environment() as cache:
+        assert classify_genres(None, ["Novel A"], cache=cache) == [("error", 0.0)]
+        assert len(cache) == 0
+
+def test_zero_shot_results_are_reused():
+    with stub_environment() as cache:
+        classify_genres_zero_shot(lambda: StubPipeline(), ["Novel A"], cache=cache)
+        assert classify_genres(lambda: StubPipeline(fail=True), ["Novel A"], cache=cache) == [("Fiction", 0.9)]
+
+def _bare_pipeline(pipeline_class, tokenizer):
+    """Build just enough of a pipeline to call its tokenization step."""
+    bare = object.__new__(pipeline_class)
+    bare.tokenizer = tokenizer
+    bare.framework = "pt"
+    if pipeline_class is CachedHypothesisPipeline:
+        bare._label_encodings = {}
+        bare._last_premise = ("", [])
+    return bare
+
+def test_cached_hypothesis_tokenization():
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    base = _bare_pipeline(ZeroShotClassificationPipeline, tokenizer)
+    cached = _bare_pipeline(CachedHypothesisPipeline, tokenizer)
+    
+    titles = [
+        "Pride and Prejudice",
+        # Longer than model_max_length, so the premise has to be truncated
+        " ".join(["Chronicles"] * tokenizer.model_max_length)
+    ]
+    for title in titles:
+        premise = INPUT_TEMPLATE.format(title)
+        for label in CANDIDATE_LABELS:
+            pair = [[premise, HYPOTHESIS_TEMPLATE.format(label)]]
+            expected = base._parse_and_tokenize(pair)
+            actual = cached._parse_and_tokenize(pair)
+            assert set(actual.keys()) == set(expected.keys())
+            for name in expected:
+                assert actual[name].tolist() == expected[name].tolist()
+            assert actual["input_ids"].shape[1] <= tokenizer.model_max_length
 
 if __name__ == "__main__":
+    test_classify_genres_deduplicates_titles()
+    test_classify_genres_keeps_input_order()
+    test_classify_genres_does_not_cache_errors()
+    test_classify_genres_separates_backends_and_prompts()
+    test_classify_genres_without_classifier()
+    test_zero_shot_results_are_reused()
+    test_cached_hypothesis_tokenization()
     test_classifier() 
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""Tests for the Google Sheets helpers, using a stub service."""
+
+from typing import Dict, List
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from sheets_operations import _contiguous_runs, read_book_titles
+
+class StubRequest:
+    def __init__(self, response: Dict):
+        self.response = response
+
+    def execute(self, **kwargs) -> Dict:
+        return self.response
+
+class FailingRequest:
+    def execute(self, **kwargs) -> Dict:
+        raise HttpError(httplib2.Response({"status": 500}), b"")
+
+class StubService:
+    """Minimal stand-in for the Sheets service over a single column.
+
+    Mirrors the real API by trimming trailing empty rows from each range.
+    """
+
+    def __init__(self, cells: Dict[int, str], row_count: int = 1000, fail_range: str = None):
+        self.cells = cells
+        self.row_count = row_count
+        self.fail_range = fail_range
+        self.requested: List[str] = []
+
+    def spreadsheets(self) -> "StubService":
+        return self
+
+    def values(self) -> "StubService":
+        return self
+
+    def get(self, spreadsheetId: str, range: str = None, **kwargs) -> StubRequest:
+        if range is None:
+            return StubRequest({'sheets': [{'properties': {'gridProperties': {'rowCount': self.row_count}}}]})
+
+        self.requested.append(range)
+        if range == self.fail_range:
+            return FailingRequest()
+        first_cell, last_cell = range.split('!')[1].split(':')
+        first_row = int(''.join(c for c in first_cell if c.isdigit()))
+        last_row = int(''.join(c for c in last_cell if c.isdigit()))
+        rows = [[self.cells[row]] if row in self.cells else [] for row in range_rows(first_row, last_row)]
+        while rows and not rows[-1]:
+            rows.pop()
+        return StubRequest({'values': rows} if rows else {})
+
+def range_rows(first_row: int, last_row: int) -> List[int]:
+    return list(range(first_row, last_row + 1))
+
+def test_contiguous_runs_merges_unsorted_input():
+    updates = [("S!F4", "c"), ("S!F2", "a"), ("S!F3", "b")]
+    assert _contiguous_runs(updates) == [("S!F2:F4", ["a", "b", "c"])]
+
+def test_contiguous_runs_splits_on_gaps():
+    updates = [("S!F10", "d"), ("S!F3", "b"), ("S!F2", "a"), ("S!F12", "e")]
+    assert _contiguous_runs(updates) == [
+        ("S!F2:F3", ["a", "b"]),
+        ("S!F10:F10", ["d"]),
+        ("S!F12:F12", ["e"])
+    ]
+
+def test_contiguous_runs_keeps_sheets_apart():
+    updates = [("A!F2", "a"), ("B!F3", "b")]
+    assert _contiguous_runs(updates) == [("A!F2:F2", ["a"]), ("B!F3:F3", ["b"])]
+
+def test_read_book_titles_bounded_range_reads_past_blank_gap():
+    cells = {2: "t2", 3: "t3", 4: "t4", 5: "t5", 251: "t251", 252: "t252"}
+    service = StubService(cells)
+    books = list(read_book_titles(service, "id", "S!A2:A260"))
+    assert books == [(title, row, "A") for row, title in sorted(cells.items())]
+    assert service.requested[-1] == "S!A202:A260"
+
+def test_read_book_titles_unbounded_range_reads_to_sheet_end():
+    cells = {2: "t2", 3: "t3", 251: "t251", 252: "t252"}
+    service = StubService(cells, row_count=300)
+    books = list(read_book_titles(service, "id", "S!A2:A"))
+    assert books == [(title, row, "A") for row, title in sorted(cells.items())]
+    assert service.requested == ["S!A2:A101", "S!A102:A201", "S!A202:A300"]
+
+def test_read_book_titles_skips_blank_rows_within_page():
+    cells = {2: "t2", 4: "t4", 7: "t7"}
+    service = StubService(cells, row_count=10)
+    books = list(read_book_titles(service, "id", "S!A2:A", page_size=3))
+    assert books == [("t2", 2, "A"), ("t4", 4, "A"), ("t7", 7, "A")]
+    assert service.requested == ["S!A2:A4", "S!A5:A7", "S!A8:A10"]
+
+def test_read_book_titles_empty_sheet():
+    service = StubService({}, row_count=5)
+    assert list(read_book_titles(service, "id", "S!A2:A")) == []
+
+def test_read_book_titles_single_cell_reads_one_row():
+    service = StubService({2: "t2", 3: "t3"})
+    assert list(read_book_titles(service, "id", "S!A2")) == [("t2", 2, "A")]
+    assert service.requested == ["S!A2:A2"]
+
+def test_read_book_titles_raises_on_failed_page():
+    cells = {2: "t2", 3: "t3", 251: "t251"}
+    service = StubService(cells, row_count=300, fail_range="S!A102:A201")
+    books = []
+    try:
+        for book in read_book_titles(service, "id", "S!A2:A"):
+            books.append(book)
+    except HttpError:
+        pass
+    else:
+        raise AssertionError("expected HttpError from the failed page")
+    assert books == [("t2", 2, "A"), ("t3", 3, "A")]
+
+if __name__ == "__main__":
+    test_contiguous_runs_merges_unsorted_input()
+    test_contiguous_runs_splits_on_gaps()
+    test_contiguous_runs_keeps_sheets_apart()
+    test_read_book_titles_bounded_range_reads_past_blank_gap()
+    test_read_book_titles_unbounded_range_reads_to_sheet_end()
+    test_read_book_titles_skips_blank_rows_within_page()
+    test_read_book_titles_empty_sheet()
+    test_read_book_titles_single_cell_reads_one_row()
+    test_read_book_titles_raises_on_failed_page()
+    print("All sheets tests passed")